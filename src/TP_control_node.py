@@ -153,7 +153,7 @@ class TP_controller:
                                                             odom.pose.pose.orientation.z,
                                                             odom.pose.pose.orientation.w])
 
-        eta     = np.array([x,y,z,yaw]).reshape((4,1))
+        eta     = np.array([x,y,z,yaw])
 
         self.robot.updateMobileBaseState(eta)
     
@@ -55,6 +55,10 @@ MANI_MZ                 = 0.0722        # [met]
 MANI_MX                 = 0.0565        # [met]
 MANI_ALPHA_SIL          = -np.pi/2.0    # [rad]
 MANI_ALPHA_HIL          = np.pi/2.0     # [rad]
+ROBOT_DOF               = 6             # columns of the robot Jacobian (2 base + 4 manipulator joints)
+
+Q_HISTORY_LEN           = 1000          # number of joint states kept by track_q
+ERR_HISTORY_LEN         = 1000          # number of task errors kept by track_err
 
 limit_joint1_upper      =  1.571
 limit_joint1_lower      = -1.571
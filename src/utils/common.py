@@ -72,16 +72,17 @@ def kinematics(d, theta, a, alpha, Tb):
             alpha (list of double)  : list of rotations around X-axis
 
         Returns:
-            (list of Numpy array)   : list of transformations along the kinematic chain (from the base frame)
+            (Numpy array)           : (N+1)x4x4 stack of transformations along the kinematic chain (from the base frame)
     '''
-    T = [Tb] # Base transformation
+    N_order = len(d)
+    T = np.empty((N_order + 1, 4, 4))
+    T[0] = Tb # Base transformation
     # For each set of DH parameters:
     # 1. Compute the DH transformation matrix.
     # 2. Compute the resulting accumulated transformation from the base frame.
-    # 3. Append the computed transformation to T.
-    N_order = len(d)
+    # 3. Store the computed transformation in T.
     for index in range(N_order):
-        T.append(T[index] @ DH(d[index], theta[index], a[index], alpha[index]))
+        np.matmul(T[index], DH(d[index], theta[index], a[index], alpha[index]), out=T[index + 1])
 
     return T
 
@@ -92,7 +93,7 @@ def jacobian(T, revolute):
         described by a list of kinematic transformations and a list of joint types.
 
         Arguments:
-            T (list of Numpy array) : list of transformations along the kinematic chain of the robot (from the base frame)
+            T (Numpy array)         : stack of transformations along the kinematic chain of the robot (from the base frame)
             revolute (list of Bool) : list of flags specifying if the corresponding joint is a revolute joint
 
         Returns:
@@ -185,6 +186,17 @@ def translation2D(x:float, y:float):
     ])
     return T
 
+def transformation2D(x:float, y:float, psi:float):
+    # Closed form of translation2D(x, y) @ rotation2D(psi)
+    c, s = math.cos(psi), math.sin(psi)
+    T = np.array([
+        [c, -s,     0, x],
+        [s,  c,     0, y],
+        [0,  0,     1, 0],
+        [0,  0,     0, 1]
+    ])
+    return T
+
 def normalize_angle(angle):
     """
     Normalize an angle to be within the range of -pi to pi.
@@ -199,4 +211,31 @@ def normalize_angle(angle):
         angle += 2*math.pi
     while angle > math.pi:
         angle -= 2*math.pi
-    return angle
\ No newline at end of file
+    return angle
+
+class RingBuffer:
+    '''
+        Fixed-size float32 history, the oldest entry is overwritten once it is full.
+
+        Arguments:
+        length (integer): number of entries kept
+        row_shape (tuple): shape of one entry
+    '''
+    def __init__(self, length:int, row_shape:tuple):
+        self.data   = np.empty((length,) + tuple(row_shape), dtype=np.float32)
+        self.index  = 0                                 # total number of pushed entries
+
+    '''
+        Method that writes a value into the next slot of the buffer.
+    '''
+    def push(self, value):
+        self.data[self.index % len(self.data)] = value
+        self.index += 1
+
+    '''
+        Method that returns the stored entries, oldest first.
+    '''
+    def get(self):
+        if self.index <= len(self.data):
+            return self.data[:self.index].copy()
+        return np.roll(self.data, -(self.index % len(self.data)), axis=0)
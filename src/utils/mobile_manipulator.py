@@ -1,8 +1,79 @@
 from .common import *
 import math
+import warnings
 import numpy as np
 from config import *
 
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional, fall back to plain Python kernels
+    warnings.warn("numba is not installed, kinematics kernels run as plain Python and are slower", RuntimeWarning)
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+# Kernels are compiled eagerly from explicit signatures at import, so the first
+# control tick does not pay for JIT compilation
+@njit('UniTuple(float64, 2)(float64)', cache=True, fastmath=True, inline='always')
+def _sincos(x):
+    '''
+        Returns (sin(x), cos(x)) evaluated next to each other, so the compiled kernels
+        can combine them into a single sincos call.
+    '''
+    return math.sin(x), math.cos(x)
+
+@njit('float64(' + 'float64, ' * 10 + 'float64[:, ::1])', cache=True, fastmath=True)
+def _ee_jacobian_kernel(q1, q2, q3, yaw, alpha, bx, d1, d2, mx, bmx, out):
+    '''
+        Kernel that writes the base (m1, m2) and manipulator (q1, q2, q3) columns of the
+        end-effector Jacobian into out and returns the horizontal reach of the arm.
+    '''
+    s2, c2  = _sincos(q2)
+    s3, c3  = _sincos(q3)
+    sy, cy  = _sincos(yaw)
+    sb, cb  = _sincos(q1 + yaw)                         # heading of the arm in the base DH chain
+    sp, cp  = _sincos(q1 + yaw + alpha)                 # heading of the arm in the world frame
+
+    l       = bx - d1 * s2 + d2 * c3 + mx               # total length from base to ee top projection
+
+    out[0, 0] = -(bmx * sy + l * sb)                    # derivertive by m1
+    out[1, 0] =   bmx * cy + l * cb
+
+    out[0, 1] =  cy                                     # derivertive by m2
+    out[1, 1] =  sy
+
+    out[0, 2] = -l * sp                                 # derivertive by q1
+    out[1, 2] =  l * cp
+
+    out[0, 3] = -d1 * c2 * cp                           # derivertive by q2
+    out[1, 3] = -d1 * c2 * sp
+    out[2, 3] =  d1 * s2
+
+    out[0, 4] = -d2 * s3 * cp                           # derivertive by q3
+    out[1, 4] = -d2 * s3 * sp
+    out[2, 4] = -d2 * c3
+
+    return l
+
+@njit('void(' + 'float64, ' * 16 + 'float64[:, ::1])', cache=True, fastmath=True)
+def _ee_position_kernel(q1, q2, q3, x, y, z, yaw, alpha, bx, bz, d1, d2, mx, mz, bmx, bmz, out):
+    '''
+        Kernel that writes the end-effector position (forward kinematics) into out.
+    '''
+    s2, c2  = _sincos(q2)
+    s3, c3  = _sincos(q3)
+    sp, cp  = _sincos(q1 + yaw + alpha)
+    sy, cy  = _sincos(yaw)
+
+    l       = bx - d1 * s2 + d2 * c3 + mx
+
+    out[0, 0] = l * cp + x + bmx * cy
+    out[1, 0] = l * sp + y + bmx * sy
+    out[2, 0] = -(bz + d1 * c2 + d2 * s3 - mz) + z + bmz
+
 class ManipulatorParams:
     def __init__(self) -> None:
         self.revolute = [True, True, True, True]
@@ -50,19 +121,62 @@ class MobileManipulator:
         self.baseParams = MobileBaseParams()
 
         self.dof            = self.manipulatorParams.dof + self.baseParams.dof
+        # Task Jacobian buffers are sized from ROBOT_DOF, it has to match the joints here
+        assert self.dof == ROBOT_DOF, "ROBOT_DOF in config does not match the mobile manipulator DOF"
 
         # Vector of joint positions (manipulator)
-        self.q              = np.zeros((self.manipulatorParams.dof, 1))
-        self.q_hist         = []
+        self.q              = np.zeros(self.manipulatorParams.dof)
+
+        # Last Q_HISTORY_LEN joint states
+        self._q_hist        = RingBuffer(Q_HISTORY_LEN, (self.manipulatorParams.dof,))
 
         # Vector of base pose (position & orientation)
-        self.eta            = np.zeros((4, 1))
+        self.eta            = np.zeros(4)
+
+        # End-effector Jacobian buffer, constant entries are filled once here
+        self._J             = np.zeros((6, self.dof))
+        self._J[5, 0]       = 1                         # m1 rotates the end-effector about Z
+        self._J[5, 2]       = 1                         # q1 rotates the end-effector about Z
+        self._J[5, 5]       = 1                         # q4 rotates the end-effector about Z
+
+        # Mobile base Jacobian buffer, the manipulator columns stay zero
+        self._J_mm          = np.zeros((6, self.dof))
+
+        # Transformations along the end-effector kinematic chain (base + 3 links),
+        # only built on request since the Jacobian is evaluated in closed form
+        self.T              = np.tile(np.eye(4), (4, 1, 1))
+        self._T_stamp       = -1
+        self._reach         = 0.0
+
+        # State stamp, bumped on every state update to invalidate the cached kinematics
+        self._jac_stamp     = 0
+        self._J_ee_stamp    = -1
+        self._J_mm_stamp    = -1
+        self._ee_pos        = np.zeros((3, 1))
+        self._ee_pos_stamp  = -1
 
 
     '''
         Method that returns the end-effector transformation.
     '''
     def getEETransform(self):
+        if self._T_stamp != self._jac_stamp:
+            self._T_stamp = self._jac_stamp
+            self.getEEJacobian()
+
+            # Base kinematics
+            Tb = transformation2D(self.eta[0], self.eta[1], self.eta[3])
+
+            # Modify the theta of the base joint, to account for an additional Z rotation
+            theta = self.q[0] - deg90
+
+            # Combined system kinematics (DH parameters extended with base DOF)
+            thetaExt    = np.array([deg90,                                 0,       theta])
+            dExt        = np.array([self.baseParams.bmz, self.baseParams.bmx,           0])
+            aExt        = np.array([0,                                     0, self._reach])
+            alphaExt    = np.array([deg90,                            -deg90,           0])
+
+            self.T      = kinematics(dExt, thetaExt, aExt, alphaExt, Tb)
         return self.T[-1]
 
     '''
@@ -95,66 +209,36 @@ class MobileManipulator:
 
     
     def track_q(self):
-        # self.q_hist.append(((np.rad2deg(self.q))% 360 + 360) % 360)
-        # self.q_hist.append((np.rad2deg(self.theta)))
-        self.q_hist.append(self.q)
+        self._q_hist.push(self.q)
+
+    '''
+        Method that returns the tracked joint states, oldest first.
+    '''
+    def getQHistory(self):
+        return self._q_hist.get()
     
     def reset(self):
         # Reset the robot's state to the initial conditions
-        self.q = np.zeros((len(self.revolute), 1))
-        self.eta = np.zeros((4, 1))
-        self.update(np.zeros((self.dof, 1)), 0.0)
+        self.q = np.zeros(self.manipulatorParams.dof)
+        self.eta = np.zeros(4)
+        self._jac_stamp += 1
 
     '''
         Method that returns the end-effector Jacobian.
     '''
     def getEEJacobian(self): 
-        J = np.zeros((6, self.dof))
-        q1, q2, q3, q4  = self.q
-    
-        l1p     = -self.manipulatorParams.d1 * math.sin(q2)               #projection of d1 on x-axis 
-        l2p     =  self.manipulatorParams.d2 * math.cos(q3)               #projection of d2 on x-axis
-        l       =  self.manipulatorParams.bx + l1p + l2p + self.manipulatorParams.mx    #total length from base to ee top projection 
-
-        dx_dq1  = -l * math.sin(q1+self.eta[3]+self.manipulatorParams.alpha)
-        dy_dq1  =  l * math.cos(q1+self.eta[3]+self.manipulatorParams.alpha)
-        
-        
-        dx_dq2  = -self.manipulatorParams.d1 * math.cos(q2) * math.cos(q1+self.eta[3]+self.manipulatorParams.alpha)
-        dy_dq2  = -self.manipulatorParams.d1 * math.cos(q2) * math.sin(q1+self.eta[3]+self.manipulatorParams.alpha)
-        dz_dq2  =  self.manipulatorParams.d1 * math.sin(q2)
-
-
-        dx_dq3  = -self.manipulatorParams.d2 * math.sin(q3) * math.cos(q1+self.eta[3]+self.manipulatorParams.alpha)
-        dy_dq3  = -self.manipulatorParams.d2 * math.sin(q3) * math.sin(q1+self.eta[3]+self.manipulatorParams.alpha)
-        dz_dq3  = -self.manipulatorParams.d2 * math.cos(q3)
-
-        # Base kinematics
-        x = float(self.eta[0])
-        y = float(self.eta[1])
-        yaw = float(self.eta[3])
-        Tb = translation2D(x, y) @ rotation2D(yaw)
-
-        # Modify the theta of the base joint, to account for an additional Z rotation
-        theta = float(q1-deg90)
+        J = self._J
+        if self._J_ee_stamp == self._jac_stamp:
+            return J
+        self._J_ee_stamp = self._jac_stamp
 
-        # Combined system kinematics (DH parameters extended with base DOF)
-        thetaExt    = np.concatenate([np.array([deg90,                                 0]), np.array([theta])])
-        dExt        = np.concatenate([np.array([self.baseParams.bmz, self.baseParams.bmx]),    np.array([0])])
-        aExt        = np.concatenate([np.array([0,                                     0]),    np.array([l])])
-        alphaExt    = np.concatenate([np.array([deg90,                            -deg90]),    np.array([0])])
-
-        self.T      = kinematics(dExt, thetaExt, aExt, alphaExt, Tb)
-
-        T  = kinematics(dExt, thetaExt, aExt, alphaExt, Tb)
-        JB = jacobian(T, self.baseParams.revolute + [True])
+        q1, q2, q3, q4  = self.q
+        yaw     = self.eta[3]
+        mp      = self.manipulatorParams
 
-        J[:, 0] = JB[:,0].reshape((1,6))                        # derivertive by m1
-        J[:, 1] = JB[:,1].reshape((1,6))                        # derivertive by m2
-        J[:, 2] = np.array([dx_dq1, dy_dq1,      0, 0, 0, 1])   # derivertive by q1
-        J[:, 3] = np.array([dx_dq2, dy_dq2, dz_dq2, 0, 0, 0])   # derivertive by q2
-        J[:, 4] = np.array([dx_dq3, dy_dq3, dz_dq3, 0, 0, 0])   # derivertive by q3
-        J[:, 5] = np.array([     0,      0,      0, 0, 0, 1])   # derivertive by q4
+        # Base and manipulator columns, closed form of the DH chain in getEETransform
+        self._reach = _ee_jacobian_kernel(q1, q2, q3, yaw, mp.alpha, mp.bx, mp.d1, mp.d2, mp.mx,
+                                          self.baseParams.bmx, J)
 
         return J
     
@@ -162,23 +246,22 @@ class MobileManipulator:
         Method that returns the moblie base Jacobian.
     '''
     def getMMJacobian(self): 
-        J = np.zeros((6, self.dof))
+        J = self._J_mm
+        if self._J_mm_stamp == self._jac_stamp:
+            return J
+        self._J_mm_stamp = self._jac_stamp
 
         # Base kinematics
-        x = float(self.eta[0])
-        y = float(self.eta[1])
-        yaw = float(self.eta[3])
-        Tb = translation2D(x, y) @ rotation2D(yaw)
+        x = self.eta[0]
+        y = self.eta[1]
+        yaw = self.eta[3]
+        Tb = transformation2D(x, y, yaw)
 
         T  = kinematics(self.baseParams.d, self.baseParams.theta, self.baseParams.a, self.baseParams.alpha, Tb)
         JB = jacobian(T, self.baseParams.revolute)
 
-        J[:, 0] = JB[:,0].reshape((1,6))                        # derivertive by m1
-        J[:, 1] = JB[:,1].reshape((1,6))                        # derivertive by m2
-        J[:, 2] = np.array([     0,      0,      0, 0, 0, 0])   # derivertive by q4
-        J[:, 3] = np.array([     0,      0,      0, 0, 0, 0])   # derivertive by q4
-        J[:, 4] = np.array([     0,      0,      0, 0, 0, 0])   # derivertive by q4
-        J[:, 5] = np.array([     0,      0,      0, 0, 0, 0])   # derivertive by q4
+        J[:, 0] = JB[:, 0]                                      # derivertive by m1
+        J[:, 1] = JB[:, 1]                                      # derivertive by m2
 
         return J
     
@@ -186,18 +269,19 @@ class MobileManipulator:
         Method that returns the End Effector position
     '''
     def getEEposition(self):
+        if self._ee_pos_stamp == self._jac_stamp:
+            return self._ee_pos
+        self._ee_pos_stamp = self._jac_stamp
+
         q1, q2, q3, q4 = self.q
+        mp = self.manipulatorParams
 
-        l1p     = -self.manipulatorParams.d1 * math.sin(q2)               #projection of d1 on x-axis 
-        l2p     =  self.manipulatorParams.d2 * math.cos(q3)               #projection of d2 on x-axis
-        l       =  self.manipulatorParams.bx + l1p + l2p + self.manipulatorParams.mx    #total length from base to ee top projection 
- 
         #forward kinematics to get ee position     
-        x = l * math.cos(q1+self.eta[3]+self.manipulatorParams.alpha) + self.eta[0] + self.baseParams.bmx * math.cos(self.eta[3])
-        y = l * math.sin(q1+self.eta[3]+self.manipulatorParams.alpha) + self.eta[1] + self.baseParams.bmx * math.sin(self.eta[3])
-        z =-(self.manipulatorParams.bz + self.manipulatorParams.d1 * math.cos(-q2) + self.manipulatorParams.d2 * math.sin(q3) - self.manipulatorParams.mz) + self.eta[2] + self.baseParams.bmz
+        _ee_position_kernel(q1, q2, q3, self.eta[0], self.eta[1], self.eta[2], self.eta[3],
+                            mp.alpha, mp.bx, mp.bz, mp.d1, mp.d2, mp.mx, mp.mz,
+                            self.baseParams.bmx, self.baseParams.bmz, self._ee_pos)
 
-        return np.array([x, y, z]).reshape(3,1)
+        return self._ee_pos
     
     '''
         Method that returns the End Effector orientation
@@ -214,28 +298,27 @@ class MobileManipulator:
         Method that returns the moblie base position.
     '''
     def getMMposition(self):
-        return np.array([self.eta[0], self.eta[1]]).reshape(2,1)
+        return self.eta[0:2].reshape(2,1)
     
     '''
         Method that returns the moblie base position.
     '''
     def getMMorientation(self):
-        return np.array([self.eta[3]]).reshape(1,1)
+        return self.eta[3:4].reshape(1,1)
     
     '''
         Method that update the manipulator states from the sensor.
     '''
     def updateManipulatorState(self, swiftProJoint):
-        self.q[0]      = swiftProJoint[0]
-        self.q[1]      = swiftProJoint[1]
-        self.q[2]      = swiftProJoint[2]
-        self.q[3]      = swiftProJoint[3]
+        self.q[:]      = swiftProJoint[0:4]
+        self._jac_stamp += 1
     
     '''
         Method that returns the moblie base state from the sensor.
     '''
     def updateMobileBaseState(self, eta):
-        self.eta    = eta
+        self.eta    = np.ravel(eta)
+        self._jac_stamp += 1
 
 
            
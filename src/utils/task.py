@@ -1,4 +1,5 @@
 from .common import *
+from config import *
 
 class Task:
     """
@@ -9,9 +10,13 @@ class Task:
         sigma_d (numpy array): Desired sigma (goal).
         FeedForward: Feedforward component for the task.
         K: Gain for the task.
-        err_hist (list): History of task errors.
+        err_hist (RingBuffer): Last ERR_HISTORY_LEN tracked task errors (float32).
         activation (int): Activation status of the task (1 for active, 0 for inactive).
+        row_idx (numpy array): Rows of the robot Jacobian copied into the task Jacobian (set by subclasses).
+        err_hist_row (tuple): Shape of one err_hist entry, (task_dim,) unless set by subclasses.
     """
+    row_idx = None
+    err_hist_row = None
 
     def __init__(self, name: str, desired, feedforward, gain):
         """
@@ -28,10 +33,13 @@ class Task:
         self.task_dim       = np.shape(desired)[0]  # Get task dimension
         self.FeedForward    = feedforward           # Feed forward velocity
         self.K              = gain                  # Gain feed forward controller      
-        self.err_hist = []
+        err_hist_row        = (self.task_dim,) if self.err_hist_row is None else self.err_hist_row
+        self.err_hist       = RingBuffer(ERR_HISTORY_LEN, err_hist_row)
         
         self.error_task     = np.zeros((self.task_dim, 1))              # Initialize with proper dimensions
         self.err            = np.zeros((self.task_dim, 1))              # Initialize with proper dimensions
+        if self.row_idx is not None:
+            self.J          = np.zeros((len(self.row_idx), ROBOT_DOF))  # Task Jacobian, filled by update()
 
         self.active = 1                             # Activation function
 
@@ -93,7 +101,16 @@ class Task:
         """ 
         Tracks the task error by appending it to the error history.
         """
-        self.err_hist.append(self.getError())
+        self.err_hist.push(self.getError()[:, 0])
+
+    def getErrHistory(self):
+        """
+        Gets the tracked task errors.
+
+        Returns:
+            numpy array: Error history, oldest first.
+        """
+        return self.err_hist.get()
 
     def setFeedForward(self, value):
         """
@@ -154,137 +171,142 @@ class Task:
     Subclass of Task, representing the 3D Position of the End Effector task.
 """
 class EEPosition3D(Task):
-    def __init__(self, name, desired, feedforward, gain):
-        super().__init__(name, desired, feedforward, gain)
-        self.J = np.zeros((self.task_dim, 6))
+    row_idx = np.array([0, 1, 2], dtype=np.intp)
+    err_hist_row = ()                           # error norm
 
     def update(self, robot):
-        DoF     = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J = robot.getEEJacobian()[0:3, :]
+        np.take(robot.getEEJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
         # Update task error
-        self.error_task = self.getDesired() - robot.getEEposition()
+        np.subtract(self.getDesired(), robot.getEEposition(), out=self.error_task)
 
-        self.err = self.K @ (self.getDesired() - robot.getEEposition()) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.error_task, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
 
 
     def track_err(self):
-        self.err_hist.append(np.linalg.norm(self.getError()))
+        self.err_hist.push(math.hypot(self.err[0, 0], self.err[1, 0], self.err[2, 0]))
 
 """
     Subclass of Task, representing the 3D Orientation of the End Effector task.
 """
 class EEOrientation3D(Task):
-    def __init__(self, name, desired, feedforward, gain):
-        super().__init__(name, desired, feedforward, gain)
+    row_idx = np.array([5], dtype=np.intp)
+    err_hist_row = ()                           # error norm
 
     def update(self, robot):
-        DoF     = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J  = (robot.getEEJacobian()[-1, :]).reshape((self.task_dim, DoF)) 
+        np.take(robot.getEEJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
         # Update task error
-        self.error_task = self.getDesired() - robot.getEEorientation()
+        np.subtract(self.getDesired(), robot.getEEorientation(), out=self.error_task)
 
-        self.err = self.K @ (self.getDesired() - robot.getEEorientation()) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.error_task, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
        
 
     def track_err(self):
-        self.err_hist.append(np.linalg.norm(self.getError()))
+        self.err_hist.push(abs(self.err[0, 0]))
 
 """
     Subclass of Task, representing the 2D configuration task.
 """
 class EEConfiguration3D(Task):
-    def __init__(self, name, desired, feedforward, gain):
-        super().__init__(name, desired, feedforward, gain)
+    row_idx = np.array([0, 1, 2, 5], dtype=np.intp)
+    err_hist_row = (2,)                         # [position, heading] error norms
 
     def update(self, robot):
-        DoF = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J = (robot.getEEJacobian()[[0,1,2,5]]).reshape((self.task_dim, DoF))
+        np.take(robot.getEEJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
 
         # Update task error
-        self.err_pos = (self.getDesired()[0:3, 0]).reshape(3, 1) - robot.getEEposition()
+        desired = self.getDesired()
+        self.error_task[0:3] = desired[0:3] - robot.getEEposition()
+        self.error_task[3]   = normalize_angle(desired[3, 0] - robot.getEEorientation()[0, 0])
 
-        self.err_ori = normalize_angle(self.getDesired()[-1] - robot.getEEorientation())
-        
-        self.error_task =  np.block([[self.err_pos], [self.err_ori]]).reshape(self.task_dim, 1)
+        self.err_pos = self.error_task[0:3]
+        self.err_ori = self.error_task[3:4]
 
-        self.err = self.K @ (
-            np.block([[self.err_pos], [self.err_ori]]).reshape(self.task_dim, 1)
-        ) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.error_task, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
 
     def track_err(self):
-        self.err_hist.append(
-            (np.linalg.norm(self.err_pos), np.linalg.norm(self.err_ori))
+        self.err_hist.push(
+            (math.hypot(self.err_pos[0, 0], self.err_pos[1, 0], self.err_pos[2, 0]), abs(self.err_ori[0, 0]))
         )
 
 """
     Subclass of Task, representing the Heading Orientation of the mobile base task.
 """
 class MMOrientation(Task):
-    def __init__(self, name, desired, feedforward, gain):
-        super().__init__(name, desired, feedforward, gain)
-        
+    row_idx = np.array([5], dtype=np.intp)
+    err_hist_row = ()                           # error norm
+
     def update(self, robot):
-        DoF     = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J  = (robot.getMMJacobian()[-1, :]).reshape((self.task_dim, DoF)) 
+        np.take(robot.getMMJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
         # Update task error
-        self.error_task = normalize_angle(self.getDesired() - robot.getMMorientation())
+        np.subtract(self.getDesired(), robot.getMMorientation(), out=self.error_task)
+        self.error_task[0, 0] = normalize_angle(self.error_task[0, 0])
 
-        self.err = self.K @ (normalize_angle(self.getDesired() - robot.getMMorientation())) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.error_task, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
 
     def track_err(self):
-        self.err_hist.append(np.linalg.norm(self.getError()))
+        self.err_hist.push(abs(self.err[0, 0]))
 
 
 """
     Subclass of Task, representing the position of the mobile base task.
 """
 class MMPosition(Task):
-    def __init__(self, name, desired, feedforward, gain):
-        super().__init__(name, desired, feedforward, gain)
+    row_idx = np.array([0, 1], dtype=np.intp)
+    err_hist_row = ()                           # error norm
 
     def update(self, robot):
-        DoF     = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J  = (robot.getMMJacobian()[0:2, :]).reshape((self.task_dim, DoF)) 
+        np.take(robot.getMMJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
         # Update task error
-        self.error_task = self.getDesired() - robot.getMMposition()
+        np.subtract(self.getDesired(), robot.getMMposition(), out=self.error_task)
         
-        self.err = self.K @ (self.getDesired() - robot.getMMposition()) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.error_task, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
        
 
     def track_err(self):
-        self.err_hist.append(np.linalg.norm(self.getError()))
+        self.err_hist.push(math.hypot(self.err[0, 0], self.err[1, 0]))
 
 """
     Subclass of Task, representing the position of the mobile base task.
 """
 class MMConfiguration(Task):
+    row_idx = np.array([0, 1, 5], dtype=np.intp)
+    err_hist_row = ()                           # error norm
+
     def __init__(self, name, desired, feedforward, gain):
         super().__init__(name, desired, feedforward, gain)
+        self.error_task = np.zeros((2, 1))              # [distance, heading] error
+        self.err_vec    = np.zeros((self.task_dim, 1))  # [x, y, heading] error
 
     def update(self, robot):
-        DoF     = robot.getDOF()
         # Update Jacobean matrix - task Jacobian
-        self.J  = (robot.getMMJacobian()[[0,1,5]]).reshape((self.task_dim, DoF)) 
+        np.take(robot.getMMJacobian(), self.row_idx, axis=0, out=self.J, mode='clip')
 
         # Update task error
-        self.err_pos = (self.getDesired()[0:2, 0]).reshape(2, 1) - robot.getMMposition()
+        desired = self.getDesired()
+        self.err_vec[0:2] = desired[0:2] - robot.getMMposition()
+        self.err_vec[2]   = desired[2] - robot.getMMorientation()[0]
 
-        self.err_ori = self.getDesired()[-1] - robot.getMMorientation()
-        
-        error_dis = np.linalg.norm(self.err_pos)
-        self.error_task = np.block([[error_dis], [self.err_ori]]).reshape(2, 1)
+        self.err_pos = self.err_vec[0:2]
+        self.err_ori = self.err_vec[2:3]
+
+        self.error_task[0, 0] = math.hypot(self.err_vec[0, 0], self.err_vec[1, 0])
+        self.error_task[1, 0] = self.err_vec[2, 0]
 
-        self.err = self.K @ (
-            np.block([[self.err_pos], [self.err_ori]]).reshape(self.task_dim, 1)
-        ) + self.getFeedForward().reshape(self.task_dim, 1)
+        np.dot(self.K, self.err_vec, out=self.err)
+        self.err += self.getFeedForward().reshape(self.task_dim, 1)
 
     def track_err(self):
-        self.err_hist.append(np.linalg.norm(self.getError()))
+        self.err_hist.push(math.hypot(self.err[0, 0], self.err[1, 0], self.err[2, 0]))
 
 
 """
@@ -294,17 +316,11 @@ class JointPosition(Task):
     def __init__(self, name, desired_joint_number, desired, feedforward, gain):
         super().__init__(name, desired, feedforward, gain)
         self.desired_joint_number = desired_joint_number
+        # Task Jacobian is constant, it selects the joint column
+        self.J = np.zeros((1, ROBOT_DOF))
+        self.J[0, self.desired_joint_number + 1] = 1
     
     def update(self, robot):
-        DoF     = robot.getDOF()
-        # Update Jacobean matrix - task Jacobian
-        self.J = np.array(
-            [
-                1 if i == self.desired_joint_number + 1 else 0
-                for i in range(DoF)
-            ]
-        ).reshape((1, DoF))
-
         self.err = self.K * (
             np.array(
                 [self.getDesired() - robot.getJointPos(self.desired_joint_number)]
@@ -325,24 +341,34 @@ class Limit2D(Task):
         self.threshold  = threshold         # Threshold [alpha, sigma].reshape(2,1)
         self.active     = 0                 # Initialise activation function is 0
         self.link_index = link_index
+        self.setDesired(limit_range)
+        # Constant task Jacobian of the limited joint
+        self.J  = np.zeros((1, ROBOT_DOF))
+        self.J[0, self.link_index + 1] = 1
+
+    def setDesired(self, value):
+        super().setDesired(value)
+        # Activation bounds [upper - alpha, lower + alpha, upper - sigma, lower + sigma]
+        lower, upper    = value[0, 0], value[0, 1]
+        alpha, sigma    = self.threshold[0, 0], self.threshold[1, 0]
+        self.bounds     = (upper - alpha, lower + alpha, upper - sigma, lower + sigma)
 
     def update(self, robot):
-        DoF = robot.getDOF()
-        # Update Jacobean matrix - task Jacobian
-        self.J  = np.zeros((1,DoF))
-        self.J[0,self.link_index+1] = 1
         # Update task error
         q_i = robot.getJointPos(self.link_index)
         
         self.err = self.K @ np.array([0.05]).reshape(1,1)
         # Compute activation function
-        if self.active == 0 and q_i >= self.getDesired()[0,1] - self.threshold[0]:
-            self.active = -1
-        elif self.active == 0 and q_i <= self.getDesired()[0,0] + self.threshold[0]:
-            self.active = 1
-        elif self.active == -1 and q_i <= self.getDesired()[0,1] - self.threshold[1]:
-            self.active = 0
-        elif self.active == 1 and q_i >= self.getDesired()[0,0] + self.threshold[1]:
+        act_upper, act_lower, deact_upper, deact_lower = self.bounds
+        if self.active == 0:
+            if q_i >= act_upper:
+                self.active = -1
+            elif q_i <= act_lower:
+                self.active = 1
+        elif self.active == -1:
+            if q_i <= deact_upper:
+                self.active = 0
+        elif q_i >= deact_lower:
             self.active = 0
 
         return True